@@ -1,54 +1,227 @@
+import sqlite3
+from pathlib import Path
 import streamlit as st
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import diskcache
 import graphviz
+from lxml import etree, html as lxml_html
 
-def scrape_products_and_features(company: str, year: str):
-    """Scrape web search results for product information.
+USER_AGENT = "Mozilla/5.0 (compatible; mindmap/1.0)"
+# On-disk cache of parsed search results, kept across restarts for a day.
+DISK_CACHE_DIR = Path(__file__).parent / ".mindmap_cache"
+DISK_CACHE_EXPIRE = 86400
+# Errors that disable the disk cache instead of failing the search.
+DISK_CACHE_ERRORS = (OSError, sqlite3.Error, diskcache.Timeout)
+# Upper bound on how much of a page is downloaded and handed to the parser.
+MAX_PAGE_BYTES = 1_048_576
+# (connect, read) timeouts in seconds; retries cover transient failures.
+REQUEST_TIMEOUT = (3, 5)
+# Features beyond this count per product only clutter the mind map.
+MAX_FEATURES_PER_PRODUCT = 8
+# Compiled once and reused for every parsed result page; matches
+# ``.result .result__snippet`` like the original CSS selection.
+_SNIPPET_XPATH = etree.XPath(
+    '//*[contains(concat(" ", normalize-space(@class), " "), " result ")]'
+    '//*[contains(concat(" ", normalize-space(@class), " "),'
+    ' " result__snippet ")]'
+)
 
-    The function queries DuckDuckGo for public information about the
-    company's products in the given year. It then extracts naive
-    product/feature pairs from the search result snippets.
+
+class _NoProductsFound(Exception):
+    """Raised when a search yields no products, so nothing gets cached."""
+
+
+@st.cache_resource
+def _get_session():
+    """Return a shared HTTP session with pooled keep-alive connections.
+
+    Streamlit re-executes the script on every interaction, so the session
+    is held in the resource cache rather than as a module global.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=16,
+        max_retries=Retry(
+            total=2,
+            backoff_factor=0.2,
+            status_forcelist=(429, 500, 502, 503, 504),
+        ),
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    session.headers["Accept"] = "text/html,application/xhtml+xml"
+    return session
+
+
+@st.cache_resource
+def _get_disk_cache():
+    """Return the on-disk cache holding parsed search results.
+
+    Only the small product/feature dicts are stored, so warm queries
+    survive app restarts and spare DuckDuckGo's rate limits without
+    caching raw page bodies. Returns ``None`` when the cache cannot be
+    opened, in which case results are only kept in memory.
     """
-    query = f"{company} {year} products"
-    url = "https://duckduckgo.com/html/"
     try:
-        resp = requests.get(url, params={"q": query}, timeout=10)
-    except requests.RequestException:
+        return diskcache.Cache(DISK_CACHE_DIR)
+    except DISK_CACHE_ERRORS:
+        return None
+
+
+def _node_text(element) -> str:
+    """Return the stripped text of ``element`` with children space-joined."""
+    if len(element) == 0:
+        # leaf node: no need to walk descendants
+        return (element.text or "").strip()
+    return " ".join(element.itertext()).strip()
+
+
+def _fetch_search_page(query: str):
+    """Download the DuckDuckGo result page for ``query``.
+
+    Returns ``(content, encoding)`` where ``encoding`` is the charset
+    declared in the Content-Type header, or ``None`` if there is none.
+
+    At most ``MAX_PAGE_BYTES`` are read. Non-HTML responses and responses
+    whose declared length exceeds the cap yield an empty body. Network
+    and HTTP errors raise ``requests.RequestException``.
+    """
+    url = "https://html.duckduckgo.com/html/"
+    resp = _get_session().get(
+        url, params={"q": query}, timeout=REQUEST_TIMEOUT, stream=True
+    )
+    with resp:
+        if resp.status_code != 200:
+            raise requests.HTTPError(f"HTTP {resp.status_code}", response=resp)
+        content_type = resp.headers.get("Content-Type", "")
+        if "html" not in content_type:
+            return b"", None
+        # Skip oversized pages before reading any of the body.
+        length = resp.headers.get("Content-Length", "")
+        if length.isdigit() and int(length) > MAX_PAGE_BYTES:
+            return b"", None
+        # requests falls back to ISO-8859-1 for text/* without a charset,
+        # so only trust resp.encoding when the header names one.
+        encoding = resp.encoding if "charset" in content_type.lower() else None
+        content = bytearray()
+        for chunk in resp.iter_content(chunk_size=65536):
+            content += chunk
+            if len(content) >= MAX_PAGE_BYTES:
+                break
+        return bytes(content[:MAX_PAGE_BYTES]), encoding
+
+
+def _parse_search_page(content: bytes, encoding=None) -> dict:
+    """Extract product/feature pairs from a DuckDuckGo result page.
+
+    ``encoding`` is the charset from the HTTP header; without it lxml
+    falls back to the page's own meta charset or its default guess.
+    """
+    if not content:
         return {}
-    if resp.status_code != 200:
+    parser = None
+    if encoding:
+        try:
+            parser = lxml_html.HTMLParser(encoding=encoding)
+        except LookupError:
+            # unknown charset name: let lxml detect the encoding itself
+            pass
+    try:
+        tree = lxml_html.fromstring(content, parser=parser)
+    except etree.ParserError:
+        # whitespace-only, comment-only or declaration-only documents
         return {}
-    soup = BeautifulSoup(resp.text, "html.parser")
     data = {}
-    for result in soup.select('.result'):
-        snippet_tag = result.select_one('.result__snippet')
-        if not snippet_tag:
-            continue
-        snippet = snippet_tag.get_text(" ").strip()
+    for snippet_tag in _SNIPPET_XPATH(tree):
+        snippet = _node_text(snippet_tag)
         if not snippet:
             continue
-        words = [w.strip('.,;:!?()[]') for w in snippet.split() if w.isalpha()]
+        words = [w for w in snippet.split() if w.isalpha()]
         if not words:
             continue
         product = words[0]
-        features = words[1:5]
-        if product:
-            data.setdefault(product, []).extend(features)
+        # dicts act as insertion-ordered sets for O(1) deduplication
+        known = data.setdefault(product, {})
+        if len(known) >= MAX_FEATURES_PER_PRODUCT:
+            continue
+        known.update(dict.fromkeys(words[1:5]))
+    return {
+        product: list(features)[:MAX_FEATURES_PER_PRODUCT]
+        for product, features in data.items()
+    }
+
+
+@st.cache_data(ttl=3600, max_entries=128, show_spinner=False)
+def _search_products(query: str) -> dict:
+    """Fetch the result page for ``query`` and extract product features.
+
+    Results are memoized in memory for an hour and on disk for a day, so
+    repeated clicks for the same company and year return immediately,
+    even after a restart. Failures and empty results raise instead of
+    returning, so they are never cached.
+    """
+    cache = _get_disk_cache()
+    data = None
+    if cache is not None:
+        try:
+            data = cache.get(query)
+        except DISK_CACHE_ERRORS:
+            cache = None
+    if not data:
+        data = _parse_search_page(*_fetch_search_page(query))
+        if not data:
+            raise _NoProductsFound(query)
+        if cache is not None:
+            try:
+                cache.set(query, data, expire=DISK_CACHE_EXPIRE)
+            except DISK_CACHE_ERRORS:
+                pass
     return data
 
-def create_mindmap(data: dict, company: str):
-    """Create a mind map using Graphviz and display it in Streamlit."""
-    graph = graphviz.Digraph(format='png')
+def scrape_products_and_features(company: str, year: str):
+    """Scrape web search results for product information.
+
+    The function queries DuckDuckGo for public information about the
+    company's products in the given year. It then extracts naive
+    product/feature pairs from the search result snippets.
+    """
+    query = f"{company} {year} products"
+    try:
+        return _search_products(query)
+    except (requests.RequestException, _NoProductsFound):
+        return {}
+
+@st.cache_data(ttl=3600, max_entries=128, show_spinner=False)
+def build_mindmap_source(data: dict, company: str) -> str:
+    """Build the Graphviz DOT source of the mind map.
+
+    The source is cached on ``(data, company)`` so Streamlit reruns with
+    unchanged results skip rebuilding the graph.
+    """
+    graph = graphviz.Digraph()
+    # Features are the most numerous nodes, so their shape is the default
+    # instead of being repeated on every node statement.
+    graph.attr('node', shape='box')
     graph.node(company, shape='ellipse')
+    edges = []
     for product, features in data.items():
         graph.node(product, shape='ellipse')
-        graph.edge(company, product)
+        edges.append((company, product))
         for feature in features:
             node_id = f"{product}_{feature}"
-            graph.node(node_id, label=feature, shape='box')
-            graph.edge(product, node_id)
-    st.graphviz_chart(graph)
+            graph.node(node_id, label=feature)
+            edges.append((product, node_id))
+    # Digraph.edges() adds all plain edges in one call
+    graph.edges(edges)
+    return graph.source
 
+def create_mindmap(data: dict, company: str):
+    """Create a mind map using Graphviz and display it in Streamlit."""
+    st.graphviz_chart(build_mindmap_source(data, company))
 
 def main():
     st.title("Mindmap des produits")